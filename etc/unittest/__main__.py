@@ -19,5 +19,6 @@ from .mcp import *
 from .tool_support_provider import *
 from .config_provider import *
 from .test_gemini import *
+from .huggingface_media import *
 
 unittest.main()
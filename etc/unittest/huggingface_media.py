@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import importlib
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from requests.structures import CaseInsensitiveDict
+
+from g4f.errors import ResponseStatusError, ResponseError
+from g4f.providers.cache import TTLCache
+from g4f.requests import get_connection_pool_args, has_curl_cffi, has_shared_async_curl, _connection_pools
+from g4f.providers.response import ImageResponse
+from g4f.Provider.needs_auth.hf import HuggingFaceMedia
+
+media_module = importlib.import_module(HuggingFaceMedia.__module__)
+
+MODELS = [
+    {"id": "org/image", "inferenceProviderMapping": [
+        {"provider": "fal-ai", "status": "live", "task": "text-to-image", "providerId": "fal/image"},
+        {"provider": "replicate", "status": "staging", "task": "text-to-image", "providerId": "replicate/image"},
+    ]},
+    {"id": "org/video", "inferenceProviderMapping": [
+        {"provider": "fal-ai", "status": "live", "task": "text-to-video", "providerId": "fal/video"},
+        {"provider": "novita", "status": "live", "task": "text-to-video", "providerId": "novita/video"},
+    ]},
+    {"id": "org/chat", "inferenceProviderMapping": [
+        {"provider": "together", "status": "live", "task": "conversational", "providerId": "together/chat"},
+    ]},
+    {"id": "org/empty", "inferenceProviderMapping": []},
+]
+
+MAPPING = {
+    "fal-ai": {"provider": "fal-ai", "status": "live", "task": "text-to-image", "providerId": "fal/image"},
+    "replicate": {"provider": "replicate", "status": "live", "task": "text-to-image", "providerId": "replicate/image"},
+    "hf-inference": {"provider": "hf-inference", "status": "live", "task": "text-to-image", "providerId": "org/image"},
+}
+
+class MockResponse:
+    def __init__(self, status: int, data: dict = None, delay: float = 0, content_type: str = "application/json"):
+        self.status = status
+        self.ok = status < 400
+        self.data = {} if data is None else data
+        self.delay = delay
+        self.headers = CaseInsensitiveDict({"Content-Type": content_type})
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
+        return self.data
+
+class MockSession:
+    requests = []
+    cancelled = []
+    responses = {}
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def post(self, url: str, json: dict = None, headers: dict = None):
+        self.requests.append((url, json, headers))
+        for key, response in self.responses.items():
+            if key in url:
+                return CancelRecorder(url, response)
+        raise AssertionError(f"Unexpected request: {url}")
+
+class CancelRecorder:
+    def __init__(self, url: str, response: MockResponse):
+        self.url = url
+        self.response = response
+
+    async def __aenter__(self):
+        try:
+            return await self.response.__aenter__()
+        except asyncio.CancelledError:
+            MockSession.cancelled.append(self.url)
+            raise
+
+    async def __aexit__(self, *args):
+        return False
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache["a"], 1)
+        cache["c"] = 3
+        self.assertEqual(list(cache), ["a", "c"])
+
+    def test_expired(self):
+        cache = TTLCache(ttl=-1)
+        cache["a"] = 1
+        self.assertNotIn("a", cache)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_set_ttl(self):
+        cache = TTLCache(ttl=60)
+        cache.set("a", 1, ttl=-1)
+        cache.set("b", 2)
+        self.assertNotIn("a", cache)
+        self.assertIn("b", cache)
+
+class TestHuggingFaceMedia(unittest.TestCase):
+
+    attributes = ("models", "image_models", "video_models", "task_mapping", "provider_mapping", "_negative_cache")
+
+    def setUp(self):
+        self.saved = {key: getattr(HuggingFaceMedia, key) for key in self.attributes}
+        HuggingFaceMedia.provider_mapping = TTLCache()
+        HuggingFaceMedia._negative_cache = TTLCache()
+        MockSession.requests = []
+        MockSession.cancelled = []
+        MockSession.responses = {}
+
+    def tearDown(self):
+        for key, value in self.saved.items():
+            setattr(HuggingFaceMedia, key, value)
+
+    def generate(self, model: str, **kwargs) -> list:
+        async def run():
+            return [chunk async for chunk in HuggingFaceMedia.create_async_generator(
+                model, [{"role": "user", "content": "a cat"}], api_key="key", **kwargs
+            )]
+        with patch.object(media_module, "StreamSession", MockSession):
+            return asyncio.run(run())
+
+    def test_large_catalog(self):
+        HuggingFaceMedia.load_models([
+            {"id": f"org/image{i}", "inferenceProviderMapping": [MAPPING["fal-ai"]]}
+            for i in range(HuggingFaceMedia.provider_mapping_maxsize + 1)
+        ])
+        self.assertIn("org/image0", HuggingFaceMedia.provider_mapping)
+
+    def test_run_once_per_api_key(self):
+        calls = []
+        async def fetch_mapping(model, api_key=None):
+            calls.append(api_key)
+            await asyncio.sleep(0.01)
+            return {}
+        async def run():
+            return await asyncio.gather(*[HuggingFaceMedia.get_mapping("org/gated", api_key) for api_key in ("a", "a", "b")])
+        with patch.object(HuggingFaceMedia, "_fetch_mapping", fetch_mapping):
+            asyncio.run(run())
+        self.assertEqual(sorted(calls), ["a", "b"])
+
+    def test_run_once_models(self):
+        calls = []
+        async def fetch_models(timeout):
+            calls.append(timeout)
+            await asyncio.sleep(0.01)
+            HuggingFaceMedia.models = ["org/image"]
+        async def run():
+            return await asyncio.gather(HuggingFaceMedia.get_models_async(), HuggingFaceMedia.get_models_async())
+        HuggingFaceMedia.models = []
+        with patch.object(HuggingFaceMedia, "load_models_from_cache", lambda: False), \
+                patch.object(HuggingFaceMedia, "_fetch_models", fetch_models):
+            self.assertEqual(asyncio.run(run()), [["org/image"], ["org/image"]])
+        self.assertEqual(len(calls), 1)
+
+    def test_load_models(self):
+        HuggingFaceMedia.load_models(MODELS)
+        self.assertEqual(HuggingFaceMedia.models, [
+            "org/video", "org/video:fal-ai", "org/video:novita",
+            "org/image", "org/image:fal-ai",
+        ])
+        self.assertEqual(HuggingFaceMedia.image_models, ["org/image"])
+        self.assertEqual(HuggingFaceMedia.video_models, ["org/video"])
+        self.assertEqual(HuggingFaceMedia.task_mapping["org/chat"], "conversational")
+
+    def test_provider_mapping_from_models(self):
+        HuggingFaceMedia.load_models(MODELS)
+        HuggingFaceMedia.models = ["org/image"]
+        mapping = asyncio.run(HuggingFaceMedia.get_mapping("org/image"))
+        self.assertEqual(list(mapping), ["fal-ai"])
+        self.assertEqual(mapping["fal-ai"]["providerId"], "fal/image")
+
+    def test_models_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = Path(cache_dir) / "models.json"
+            with patch.object(HuggingFaceMedia, "get_models_cache_file", lambda: cache_file):
+                HuggingFaceMedia.load_models(MODELS)
+                HuggingFaceMedia.write_models_cache()
+                models = HuggingFaceMedia.models
+                HuggingFaceMedia.models = []
+                HuggingFaceMedia.provider_mapping = TTLCache()
+                self.assertTrue(HuggingFaceMedia.load_models_from_cache())
+                self.assertEqual(HuggingFaceMedia.models, models)
+                self.assertEqual(HuggingFaceMedia.video_models, ["org/video"])
+                self.assertEqual(list(HuggingFaceMedia.provider_mapping["org/image"]), ["fal-ai"])
+
+    def test_serial_fallback(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = MAPPING
+        MockSession.responses = {
+            "replicate": MockResponse(500, {"error": "replicate"}),
+            "api-inference": MockResponse(500, {"error": "hf-free"}),
+            "fal-ai": MockResponse(200, {"images": [{"url": "https://a/fal.png"}]}),
+        }
+        chunks = self.generate("org/image")
+        self.assertEqual(chunks[-2].label, "HuggingFace (fal-ai)")
+        self.assertEqual([url for url, _, _ in MockSession.requests], [
+            "https://router.huggingface.co/replicate/v1/models/replicate/image/predictions",
+            "https://api-inference.huggingface.co/models/org/image",
+            "https://router.huggingface.co/fal-ai/fal/image",
+        ])
+
+    def test_race_first_success(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = MAPPING
+        MockSession.responses = {
+            "fal-ai": MockResponse(200, {"images": [{"url": "https://a/fal.png"}]}, 0.01),
+            "replicate": MockResponse(200, {"output": ["https://a/replicate.png"]}, 1),
+            "api-inference": MockResponse(500, {}, 0),
+        }
+        chunks = self.generate("org/image", race_providers=True)
+        self.assertIsInstance(chunks[-1], ImageResponse)
+        self.assertEqual(chunks[-1].urls, ["https://a/fal.png"])
+        self.assertEqual(chunks[-2].label, "HuggingFace (fal-ai)")
+        self.assertIn("https://router.huggingface.co/replicate/v1/models/replicate/image/predictions", MockSession.cancelled)
+
+    def test_race_last_error(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = MAPPING
+        MockSession.responses = {
+            "fal-ai": MockResponse(500, {"error": "first"}, 0),
+            "replicate": MockResponse(500, {"error": "last"}, 0.01),
+            "api-inference": MockResponse(500, {"error": "fallback"}, 0),
+        }
+        with self.assertRaises(ResponseStatusError) as context:
+            self.generate("org/image", race_providers=True)
+        self.assertIn("fallback", str(context.exception))
+        # hf-free and hf-inference share one endpoint, hf-inference only runs after the race
+        urls = [url for url, _, _ in MockSession.requests]
+        self.assertEqual(urls.count("https://api-inference.huggingface.co/models/org/image"), 2)
+        self.assertEqual(urls[-1], "https://api-inference.huggingface.co/models/org/image")
+
+    def test_request_builders(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = MAPPING
+        MockSession.responses = {"fal-ai": MockResponse(200, {"images": ["https://a/fal.png"]})}
+        self.generate("org/image:fal-ai", width=512, height=256)
+        url, data, headers = MockSession.requests[0]
+        self.assertEqual(url, "https://router.huggingface.co/fal-ai/fal/image")
+        self.assertEqual(data["image_size"], {"width": 512, "height": 256})
+        self.assertEqual(headers["Authorization"], "Bearer key")
+
+        MockSession.requests = []
+        MockSession.responses = {"replicate": MockResponse(200, {"output": ["https://a/replicate.png"]})}
+        self.generate("org/image:replicate")
+        url, data, _ = MockSession.requests[0]
+        self.assertEqual(url, "https://router.huggingface.co/replicate/v1/models/replicate/image/predictions")
+        self.assertEqual(data["input"]["prompt"], "a cat")
+
+        MockSession.requests = []
+        MockSession.responses = {"api-inference": MockResponse(200, {"images": ["https://a/hf.png"]})}
+        self.generate("org/image:hf-free")
+        url, data, headers = MockSession.requests[0]
+        self.assertEqual(url, "https://api-inference.huggingface.co/models/org/image")
+        self.assertEqual(data["inputs"], "a cat")
+        self.assertIsNone(headers)
+
+        HuggingFaceMedia.provider_mapping["org/video"] = {
+            "novita": {"provider": "novita", "status": "live", "task": "text-to-video", "providerId": "novita/video"},
+        }
+        MockSession.requests = []
+        MockSession.responses = {"novita": MockResponse(200, {"video": {"url": "https://a/video.mp4"}})}
+        self.generate("org/video")
+        url, data, _ = MockSession.requests[0]
+        self.assertEqual(url, "https://router.huggingface.co/novita/v3/hf/novita/video")
+        self.assertEqual(data, {"prompt": "a cat", "width": None, "height": None})
+
+    def test_binary_media(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = MAPPING
+        MockSession.responses = {"fal-ai": MockResponse(200, content_type="image/png")}
+        async def save_response_media(response, prompt, tags):
+            yield ImageResponse("/media/cat.png", prompt)
+        with patch.object(media_module, "save_response_media", save_response_media):
+            self.assertEqual(self.generate("org/image:fal-ai")[-1].urls, "/media/cat.png")
+
+        async def save_no_media(response, prompt, tags):
+            return
+            yield
+        with patch.object(media_module, "save_response_media", save_no_media):
+            with self.assertRaises(ResponseError):
+                self.generate("org/image:fal-ai")
+
+    def test_negative_cache(self):
+        HuggingFaceMedia._negative_cache.set(HuggingFaceMedia.get_negative_cache_key("org/image", "fal-ai", "key"), True, ttl=60)
+        HuggingFaceMedia._negative_cache.set(HuggingFaceMedia.get_negative_cache_key("org/image", "novita", "key"), True, ttl=-1)
+        self.assertTrue(HuggingFaceMedia.is_negative_cached("org/image", "fal-ai", "key"))
+        self.assertFalse(HuggingFaceMedia.is_negative_cached("org/image", "fal-ai", "other"))
+        self.assertFalse(HuggingFaceMedia.is_negative_cached("org/image", "novita", "key"))
+        self.assertFalse(HuggingFaceMedia.is_negative_cached("org/image", "replicate", "key"))
+        self.assertEqual(len(HuggingFaceMedia._negative_cache), 1)
+
+    def test_negative_cache_from_response(self):
+        HuggingFaceMedia.provider_mapping["org/image"] = {key: MAPPING[key] for key in ("fal-ai", "replicate")}
+        MockSession.responses = {
+            "fal-ai": MockResponse(400, {"error": "bad request"}),
+            "replicate": MockResponse(402, {"error": "payment required"}),
+        }
+        with self.assertRaises(Exception):
+            self.generate("org/image")
+        self.assertFalse(HuggingFaceMedia.is_negative_cached("org/image", "fal-ai", "key"))
+        self.assertTrue(HuggingFaceMedia.is_negative_cached("org/image", "replicate", "key"))
+
+        MockSession.requests = []
+        MockSession.responses["fal-ai"] = MockResponse(200, {"images": ["https://a/fal.png"]})
+        self.generate("org/image")
+        self.assertEqual([url for url, _, _ in MockSession.requests], ["https://router.huggingface.co/fal-ai/fal/image"])
+
+        # A selected provider is never skipped
+        MockSession.requests = []
+        MockSession.responses["replicate"] = MockResponse(200, {"output": ["https://a/replicate.png"]})
+        self.assertEqual(self.generate("org/image:replicate")[-2].label, "HuggingFace (replicate)")
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_proxy(self):
+        self.assertEqual(asyncio.run(get_connection_pool_args("http://proxy")), {"proxy": "http://proxy"})
+
+    def test_old_curl_cffi(self):
+        with patch("g4f.requests.has_curl_cffi", True), patch("g4f.requests.has_shared_async_curl", False):
+            self.assertEqual(asyncio.run(get_connection_pool_args()), {})
+
+    @unittest.skipIf(has_curl_cffi and not has_shared_async_curl, "curl_cffi before 0.16 can not share an AsyncCurl")
+    def test_shared_per_loop(self):
+        async def run():
+            args = await get_connection_pool_args()
+            self.assertIs(await get_connection_pool_args(), args)
+            return args
+        loops = [asyncio.new_event_loop() for _ in range(2)]
+        try:
+            first, second = [loop.run_until_complete(run()) for loop in loops]
+            self.assertIsNot(first, second)
+        finally:
+            for loop in loops:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+                self.assertNotIn(loop, _connection_pools)
+
+    @unittest.skipIf(has_curl_cffi and not has_shared_async_curl, "curl_cffi before 0.16 can not share an AsyncCurl")
+    def test_closed_loop(self):
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(get_connection_pool_args())
+        loop.close()
+        self.assertIn(loop, _connection_pools)
+        asyncio.run(get_connection_pool_args())
+        self.assertNotIn(loop, _connection_pools)
@@ -1,13 +1,27 @@
 from __future__ import annotations
 
+import os
+import json
 import time
 import asyncio
 import random
-import requests
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    has_orjson = True
+except ImportError:
+    has_orjson = False
 
 from ....providers.types import Messages
-from ....requests import StreamSession, raise_for_status
-from ....errors import ModelNotFoundError, MissingAuthError
+from ....providers.asyncio import get_running_loop
+from ....providers.cache import TTLCache
+from ....requests import StreamSession, raise_for_status, get_connection_pool_args
+from ....cookies import get_cookies_dir
+from ....tools.files import secure_filename
+from ....errors import ModelNotFoundError, MissingAuthError, ResponseError
 from ....providers.helper import format_media_prompt
 from ....providers.base_provider import AsyncGeneratorProvider, ProviderModelMixin
 from ....providers.response import ProviderInfo, ImageResponse, VideoResponse, Reasoning
@@ -16,6 +30,51 @@ from ....image import use_aspect_ratio
 from .... import debug
 from .models import image_model_aliases
 
+def get_api_key_hash(api_key: str = None) -> str | None:
+    return None if api_key is None else hashlib.sha256(api_key.encode()).hexdigest()
+
+def build_default_request(base_url: str, provider_id: str, task: str, prompt: str, data: dict, extra_body: dict) -> tuple[str, dict]:
+    if task == "text-to-image":
+        return f"{base_url}/v1/images/generations", {
+            "response_format": "url",
+            "model": provider_id,
+            **data
+        }
+    return f"{base_url}/{provider_id}", data
+
+def build_fal_ai_request(base_url: str, provider_id: str, task: str, prompt: str, data: dict, extra_body: dict) -> tuple[str, dict]:
+    if task == "text-to-image":
+        return f"{base_url}/{provider_id}", {
+            "image_size": {key: data[key] for key in ("width", "height") if data.get(key) is not None},
+            **extra_body
+        }
+    return f"{base_url}/{provider_id}", data
+
+def build_novita_request(base_url: str, provider_id: str, task: str, prompt: str, data: dict, extra_body: dict) -> tuple[str, dict]:
+    return f"{base_url}/v3/hf/{provider_id}", data
+
+def build_replicate_request(base_url: str, provider_id: str, task: str, prompt: str, data: dict, extra_body: dict) -> tuple[str, dict]:
+    return f"{base_url}/v1/models/{provider_id}/predictions", {
+        "input": data
+    }
+
+def build_hf_inference_request(base_url: str, provider_id: str, task: str, prompt: str, data: dict, extra_body: dict) -> tuple[str, dict]:
+    return f"https://api-inference.huggingface.co/models/{provider_id}", {
+        "inputs": prompt,
+        "parameters": {
+            "seed": random.getrandbits(32),
+            **data
+        }
+    }
+
+REQUEST_BUILDERS = {
+    "fal-ai": build_fal_ai_request,
+    "novita": build_novita_request,
+    "replicate": build_replicate_request,
+    "hf-inference": build_hf_inference_request,
+    "hf-free": build_hf_inference_request,
+}
+
 class HuggingFaceMedia(AsyncGeneratorProvider, ProviderModelMixin):
     label = "HuggingFace Media"
     parent = "HuggingFace"
@@ -24,61 +83,171 @@ class HuggingFaceMedia(AsyncGeneratorProvider, ProviderModelMixin):
     needs_auth = True
     model_aliases = image_model_aliases
 
+    use_get_models_async = True
+    models_url = "https://huggingface.co/api/models?inference=warm&expand[]=inferenceProviderMapping"
+    models_cache_ttl = 3600
+
     tasks = ["text-to-image", "text-to-video"]
-    provider_mapping: dict[str, dict] = {}
+    priority_providers = frozenset(("replicate", "together", "hf-inference"))
+    provider_mapping_maxsize = 512
+    provider_mapping: TTLCache = TTLCache(maxsize=provider_mapping_maxsize, ttl=models_cache_ttl)
+    _pending_requests: dict[tuple, asyncio.Task] = {}
+    _negative_cache: TTLCache = TTLCache(maxsize=1024)
+    negative_cache_ttl = {401: 3600, 402: 3600}
     task_mapping: dict[str, str] = {}
 
     @classmethod
     def get_models(cls, **kwargs) -> list[str]:
         if not cls.models:
-            url = "https://huggingface.co/api/models?inference=warm&expand[]=inferenceProviderMapping"
-            response = requests.get(url, timeout=kwargs.get("timeout", 15))
-            if response.ok:
-                models = response.json()
-                providers = {
-                    model["id"]: [
-                        provider
-                        for provider in model.get("inferenceProviderMapping")
-                        if provider.get("status") == "live" and provider.get("task") in cls.tasks
-                    ]
-                    for model in models
-                    if [
-                        provider
-                        for provider in model.get("inferenceProviderMapping")
-                        if provider.get("status") == "live" and provider.get("task") in cls.tasks
-                    ]
-                }
-                new_models = []
-                for model, provider_keys in providers.items():
-                    new_models.append(model)
-                    for provider_data in provider_keys:
-                        new_models.append(f"{model}:{provider_data.get('provider')}") 
-                cls.task_mapping = {
-                    model["id"]: [
-                        provider.get("task")
-                        for provider in model.get("inferenceProviderMapping")
-                    ]
-                    for model in models
-                }
-                cls.task_mapping = {model: task[0] for model, task in cls.task_mapping.items() if task}
-                prepend_models = []
-                for model, provider_keys in providers.items():
-                    task = cls.task_mapping.get(model)
-                    if task == "text-to-video":
-                        prepend_models.append(model)
-                        for provider_data in provider_keys:
-                            prepend_models.append(f"{model}:{provider_data.get('provider')}") 
-                cls.models = prepend_models + [model for model in new_models if model not in prepend_models]
-                cls.image_models = [model for model, task in cls.task_mapping.items() if task == "text-to-image"]
-                cls.video_models = [model for model, task in cls.task_mapping.items() if task == "text-to-video"]
-            else:
-                cls.models = []
+            loop = get_running_loop(check_nested=False)
+            if loop is None:
+                return asyncio.run(cls.get_models_async(**kwargs))
+            if hasattr(loop.__class__, "_nest_patched"):
+                return loop.run_until_complete(cls.get_models_async(**kwargs))
+            # Loops like uvloop can not be nested, load the models in a worker thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                return executor.submit(asyncio.run, cls.get_models_async(**kwargs)).result()
         return cls.models
 
+    @classmethod
+    async def get_models_async(cls, timeout: int = 15, **kwargs) -> list[str]:
+        if not cls.models and not await asyncio.get_running_loop().run_in_executor(None, cls.load_models_from_cache):
+            await cls._run_once(cls.models_url, cls._fetch_models, timeout)
+        return cls.models
+
+    @classmethod
+    async def _fetch_models(cls, timeout: int):
+        async with StreamSession(timeout=timeout, **await get_connection_pool_args()) as session:
+            async with session.get(cls.models_url) as response:
+                if response.ok:
+                    data = b"".join([chunk async for chunk in response.iter_content()])
+                    cls.load_models(orjson.loads(data) if has_orjson else json.loads(data))
+                    cls.write_models_cache()
+                else:
+                    cls.models = []
+
+    @classmethod
+    def get_models_cache_file(cls) -> Path:
+        return Path(get_cookies_dir()) / ".models" / f"{secure_filename(cls.models_url)}.json"
+
+    @classmethod
+    def load_models_from_cache(cls) -> bool:
+        cache_file = cls.get_models_cache_file()
+        try:
+            age = time.time() - cache_file.stat().st_mtime
+            if age > cls.models_cache_ttl:
+                return False
+            for key, value in json.loads(cache_file.read_text()).items():
+                if key == "provider_mapping":
+                    # Entries expire with the cache file, not an hour after loading it
+                    cls.set_provider_mappings(value, cls.models_cache_ttl - age)
+                else:
+                    setattr(cls, key, value)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            debug.error(f"Failed to load cached models from {cache_file}: {e}")
+            return False
+
+    @classmethod
+    def write_models_cache(cls):
+        cache_file = cls.get_models_cache_file()
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps({
+                "models": cls.models,
+                "image_models": cls.image_models,
+                "video_models": cls.video_models,
+                "task_mapping": cls.task_mapping,
+                "provider_mapping": cls.provider_mapping,
+            }))
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            debug.error(f"Failed to cache models to {cache_file}: {e}")
+
+    @classmethod
+    def set_provider_mappings(cls, mappings: dict[str, dict], ttl: float = None):
+        # Make room for the whole catalog, so that no listed model is evicted
+        cls.provider_mapping.maxsize = max(cls.provider_mapping.maxsize, len(mappings) + cls.provider_mapping_maxsize)
+        for model, mapping in mappings.items():
+            cls.provider_mapping.set(model, mapping, ttl)
+
+    @classmethod
+    def load_models(cls, models: list[dict]):
+        video_first = []
+        others = []
+        seen = set()
+        mappings = {}
+        cls.task_mapping = {}
+        cls.image_models = []
+        cls.video_models = []
+        for model in models:
+            model_id = model["id"]
+            mapping = model.get("inferenceProviderMapping") or []
+            if not mapping or model_id in seen:
+                continue
+            seen.add(model_id)
+            task = mapping[0].get("task")
+            cls.task_mapping[model_id] = task
+            if task == "text-to-image":
+                cls.image_models.append(model_id)
+            elif task == "text-to-video":
+                cls.video_models.append(model_id)
+            live_providers = [
+                provider.get("provider")
+                for provider in mapping
+                if provider.get("status") == "live" and provider.get("task") in cls.tasks
+            ]
+            if not live_providers:
+                continue
+            mappings[model_id] = {
+                provider["provider"]: provider
+                for provider in mapping
+                if provider.get("status") == "live"
+            }
+            target = video_first if task == "text-to-video" else others
+            target.append(model_id)
+            target.extend(f"{model_id}:{provider}" for provider in live_providers)
+        cls.set_provider_mappings(mappings)
+        cls.models = video_first + others
+
     @classmethod
     async def get_mapping(cls, model: str, api_key: str = None):
-        if model in cls.provider_mapping:
-            return cls.provider_mapping[model]
+        mapping = cls.provider_mapping.get(model)
+        if mapping is not None:
+            return mapping
+        # Gated models may be visible to one api key, but not to another
+        return await cls._run_once((model, get_api_key_hash(api_key)), cls._fetch_mapping, model, api_key)
+
+    @classmethod
+    def get_negative_cache_key(cls, model: str, provider_key: str, api_key: str) -> tuple[str, str, str]:
+        # 401 and 402 depend on the api key and its billing, not only on the model
+        return model, provider_key, get_api_key_hash(api_key)
+
+    @classmethod
+    def is_negative_cached(cls, model: str, provider_key: str, api_key: str) -> bool:
+        return cls.get_negative_cache_key(model, provider_key, api_key) in cls._negative_cache
+
+    @classmethod
+    async def _run_once(cls, key: str | tuple, func, *args):
+        # Concurrent callers on the same loop with the same key share one in-flight request
+        key = (asyncio.get_running_loop(), key)
+        task = cls._pending_requests.get(key)
+        if task is None:
+            task = asyncio.create_task(func(*args))
+            cls._pending_requests[key] = task
+            task.add_done_callback(lambda _: cls._pending_requests.pop(key, None))
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _fetch_mapping(cls, model: str, api_key: str = None) -> dict:
+        # Use the bulk model list if it is cached, but don't download the whole catalog for one model
+        if not cls.models and await asyncio.get_running_loop().run_in_executor(None, cls.load_models_from_cache):
+            mapping = cls.provider_mapping.get(model)
+            if mapping is not None:
+                return mapping
         headers = {
             'Content-Type': 'application/json',
         }
@@ -87,12 +256,14 @@ class HuggingFaceMedia(AsyncGeneratorProvider, ProviderModelMixin):
         async with StreamSession(
             timeout=30,
             headers=headers,
+            **await get_connection_pool_args()
         ) as session:
             async with session.get(f"https://huggingface.co/api/models/{model}?expand[]=inferenceProviderMapping") as response:
                 await raise_for_status(response)
                 model_data = await response.json()
-                cls.provider_mapping[model] = {key: value for key, value in model_data.get("inferenceProviderMapping").items() if value["status"] == "live"}
-        return cls.provider_mapping[model]
+                provider_mapping = {key: value for key, value in model_data.get("inferenceProviderMapping").items() if value["status"] == "live"}
+        cls.provider_mapping[model] = provider_mapping
+        return provider_mapping
 
     @classmethod
     async def create_async_generator(
@@ -112,6 +283,8 @@ class HuggingFaceMedia(AsyncGeneratorProvider, ProviderModelMixin):
         width: int = None,
         # Video Generation
         resolution: str = "480p",
+        # Send the request to all providers at once, the losers still run and bill their jobs
+        race_providers: bool = False,
         **kwargs
     ):
         if not api_key:
@@ -122,137 +295,184 @@ class HuggingFaceMedia(AsyncGeneratorProvider, ProviderModelMixin):
         if model and ":" in model:
             model, selected_provider = model.split(":", 1)
         elif not model:
-            model = cls.get_models()[0]
-        prompt = format_media_prompt(messages, prompt)
-        provider_mapping = await cls.get_mapping(model, api_key)
-        headers = {
-            'Accept-Encoding': 'gzip, deflate',
-            'Content-Type': 'application/json',
-            'Prefer': 'wait',
-        }
-        new_mapping = {
+            model = (await cls.get_models_async())[0]
+        started = time.time()
+        mapping_task = asyncio.create_task(cls.get_mapping(model, api_key))
+        try:
+            yield Reasoning(label="Generating", status="0.00s")
+            prompt = format_media_prompt(messages, prompt)
+            headers = {
+                'Accept-Encoding': 'gzip, deflate',
+                'Content-Type': 'application/json',
+                'Prefer': 'wait',
+            }
+            authed_headers = {**headers, "Authorization": f"Bearer {api_key}"}
+            base_info = {**cls.get_dict(), "url": f"{cls.url}/{model}"}
+            provider_mapping = await mapping_task
+        finally:
+            # Don't leave the lookup running if the consumer stops at the first reasoning
+            mapping_task.cancel()
+        ordered_mapping = {
             "hf-free" if key == "hf-inference" else key: value for key, value in provider_mapping.items()
-            if key in ["replicate", "together", "hf-inference"]
+            if key in cls.priority_providers
         }
-        provider_mapping = {**new_mapping, **provider_mapping}
+        for key, value in provider_mapping.items():
+            ordered_mapping.setdefault(key, value)
+        provider_mapping = ordered_mapping
         if not provider_mapping:
             raise ModelNotFoundError(f"Model is not supported: {model} in: {cls.__name__}")
-        async def generate(extra_body: dict, aspect_ratio: str = None):
-            last_response = None
-            for provider_key, provider in provider_mapping.items():
-                if selected_provider is not None and selected_provider != provider_key:
-                    continue
-                provider_info = ProviderInfo(**{**cls.get_dict(), "label": f"HuggingFace ({provider_key})", "url": f"{cls.url}/{model}"})
-
-                base_url = f"https://router.huggingface.co/{provider_key}"
-                task = provider["task"]
-                provider_id = provider["providerId"]
-                if task not in cls.tasks:
-                    raise ModelNotFoundError(f"Model is not supported: {model} in: {cls.__name__} task: {task}")
+        aspect_ratios = {
+            "text-to-image": "1:1" if aspect_ratio is None else aspect_ratio,
+            "text-to-video": "16:9" if aspect_ratio is None else aspect_ratio,
+        }
+        image_data = {
+            "prompt": prompt,
+            **{"width": width, "height": height},
+            **use_aspect_ratio({
+                **extra_body,
+                "height": height,
+                "width": width,
+            }, aspect_ratios["text-to-image"]),
+        }
+        video_data = {
+            "prompt": prompt,
+            **{"width": width, "height": height},
+            "num_inference_steps": 20,
+            "resolution": resolution,
+            "aspect_ratio": aspect_ratios["text-to-video"],
+            **extra_body
+        }
+        async def generate_with(session: StreamSession, provider_key: str, provider: dict):
+            base_url = f"https://router.huggingface.co/{provider_key}"
+            task = provider["task"]
+            provider_id = provider["providerId"]
+            if task not in cls.tasks:
+                raise ModelNotFoundError(f"Model is not supported: {model} in: {cls.__name__} task: {task}")
 
-                if aspect_ratio is None:
-                    aspect_ratio = "1:1" if task == "text-to-image" else "16:9"
-                extra_body_image = use_aspect_ratio({
-                    **extra_body,
-                    "height": height,
-                    "width": width,
-                }, aspect_ratio)
-                extra_body_video = {}
-                if task == "text-to-video" and provider_key != "novita":
-                    extra_body_video = {
-                        "num_inference_steps": 20,
-                        "resolution": resolution,
-                        "aspect_ratio": aspect_ratio,
-                        **extra_body
-                    }
-                url = f"{base_url}/{provider_id}"
-                data = {
-                    "prompt": prompt,
-                    **{"width": width, "height": height},
-                    **(extra_body_video if task == "text-to-video" else extra_body_image),
-                }
-                if provider_key == "fal-ai" and task == "text-to-image":
-                    data = {
-                        "image_size": use_aspect_ratio({
-                            "height": height,
-                            "width": width,
-                        }, aspect_ratio),
-                        **extra_body
-                    }
-                elif provider_key == "novita":
-                    url = f"{base_url}/v3/hf/{provider_id}"
-                elif provider_key == "replicate":
-                    url = f"{base_url}/v1/models/{provider_id}/predictions"
-                    data = {
-                        "input": data
-                    }
-                elif provider_key in ("hf-inference", "hf-free"):
-                    base_url = "https://api-inference.huggingface.co"
-                    url = f"{base_url}/models/{provider_id}"
-                    data = {
-                        "inputs": prompt,
-                        "parameters": {
-                            "seed": random.randint(0, 2**32),
-                            **data
-                        }
-                    }
-                elif task == "text-to-image":
-                    url = f"{base_url}/v1/images/generations"
-                    data = {
-                        "response_format": "url",
-                        "model": provider_id,
-                        **data
-                    }
+            if task == "text-to-image":
+                data = image_data
+            elif provider_key == "novita":
+                data = {"prompt": prompt, **{"width": width, "height": height}}
+            else:
+                data = video_data
+            build_request = REQUEST_BUILDERS.get(provider_key, build_default_request)
+            url, data = build_request(base_url, provider_id, task, prompt, data, extra_body)
 
-                async with StreamSession(
-                    headers=headers if provider_key == "hf-free" or api_key is None else {**headers, "Authorization": f"Bearer {api_key}"},
-                    proxy=proxy,
-                    timeout=timeout
-                ) as session:
-                    async with session.post(url, json=data) as response:
-                        if response.status in (400, 401, 402):
-                            last_response = response
-                            debug.error(f"{cls.__name__}: Error {response.status} with {provider_key} and {provider_id}")
-                            continue
-                        if response.status == 404:
-                            raise ModelNotFoundError(f"Model not found: {model}")
-                        await raise_for_status(response)
-                        if response.headers.get("Content-Type", "").startswith("application/json"):
-                            result = await response.json()
-                            if "video" in result:
-                                return provider_info, VideoResponse(result.get("video").get("url", result.get("video").get("video_url")), prompt)
-                            elif task == "text-to-image":
-                                try:
-                                    return provider_info, ImageResponse([
-                                        item["url"] if isinstance(item, dict) else item
-                                        for item in result.get("images", result.get("data", result.get("output")))
-                                    ], prompt)
-                                except Exception:
-                                    raise ValueError(f"Unexpected response: {result}")
-                            elif task == "text-to-video" and result.get("output") is not None:
-                                return provider_info, VideoResponse(result["output"], prompt)
+            async with session.post(url, json=data, headers=None if provider_key == "hf-free" else authed_headers) as response:
+                if response.status in (400, 401, 402):
+                    debug.error(f"{cls.__name__}: Error {response.status} with {provider_key} and {provider_id}")
+                    if response.status in cls.negative_cache_ttl:
+                        cls._negative_cache.set(
+                            cls.get_negative_cache_key(model, provider_key, api_key), True,
+                            ttl=cls.negative_cache_ttl[response.status]
+                        )
+                    await raise_for_status(response)
+                if response.status == 404:
+                    raise ModelNotFoundError(f"Model not found: {model}")
+                await raise_for_status(response)
+                if response.headers.get("Content-Type", "").startswith("application/json"):
+                    result = await response.json()
+                    if "video" in result:
+                        return VideoResponse(result.get("video").get("url", result.get("video").get("video_url")), prompt)
+                    elif task == "text-to-image":
+                        try:
+                            return ImageResponse([
+                                item["url"] if isinstance(item, dict) else item
+                                for item in result.get("images", result.get("data", result.get("output")))
+                            ], prompt)
+                        except Exception:
                             raise ValueError(f"Unexpected response: {result}")
-                        async for chunk in save_response_media(response, prompt, [aspect_ratio, model]):
-                            return provider_info, chunk
+                    elif task == "text-to-video" and result.get("output") is not None:
+                        return VideoResponse(result["output"], prompt)
+                    raise ValueError(f"Unexpected response: {result}")
+                media = save_response_media(response, prompt, [aspect_ratios[task], model])
+                try:
+                    return await media.__anext__()
+                except StopAsyncIteration:
+                    raise ResponseError(f"No media received from {provider_key} for model: {model}")
+                finally:
+                    await media.aclose()
 
-            await raise_for_status(last_response)
+        async def generate(session: StreamSession):
+            candidates = [
+                provider_key for provider_key in provider_mapping
+                if selected_provider is None or selected_provider == provider_key
+            ]
+            if not candidates:
+                raise ModelNotFoundError(f"Provider is not supported: {selected_provider} for model: {model}")
+            # Skip providers that recently rejected this api key, unless the provider was selected
+            # or all of them did
+            skipped = set() if selected_provider is not None else {
+                provider_key for provider_key in candidates
+                if cls.is_negative_cached(model, provider_key, api_key)
+            }
+            if len(skipped) == len(candidates):
+                skipped = set()
+            candidates = [provider_key for provider_key in candidates if provider_key not in skipped]
+            if not race_providers:
+                # Try one provider after the other, each one only if the previous failed
+                last_error = None
+                for provider_key in candidates:
+                    try:
+                        result = await generate_with(session, provider_key, provider_mapping[provider_key])
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    return ProviderInfo(**{**base_info, "label": f"HuggingFace ({provider_key})"}), result
+                raise last_error
+            # Race all candidate providers, the first successful response wins
+            # hf-free and hf-inference share one endpoint, hf-inference is only tried if the race fails
+            fallbacks = [key for key in candidates if key == "hf-inference" and "hf-free" in candidates]
+            racers = {}
+            def start(provider_key: str) -> asyncio.Task:
+                task = asyncio.create_task(generate_with(session, provider_key, provider_mapping[provider_key]))
+                racers[task] = provider_key
+                return task
+            pending = {start(provider_key) for provider_key in candidates if provider_key not in fallbacks}
+            result = None
+            last_error = None
+            try:
+                while result is None and (pending or fallbacks):
+                    if not pending:
+                        pending = {start(fallbacks.pop(0))}
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is not None:
+                            last_error = task.exception()
+                        elif result is None:
+                            result = task.result()
+                            winner = racers[task]
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            if result is None:
+                raise last_error
+            return ProviderInfo(**{**base_info, "label": f"HuggingFace ({winner})"}), result
 
-        background_tasks = set()
-        running_tasks = set()
-        started = time.time()
-        while n > 0:
-            n -= 1
-            task = asyncio.create_task(generate(extra_body, aspect_ratio))
-            background_tasks.add(task)
-            running_tasks.add(task)
-            task.add_done_callback(running_tasks.discard)
-        while running_tasks:
-            diff = time.time() - started
-            if diff > 1:
-                yield Reasoning(label="Generating", status=f"{diff:.2f}s")
-            await asyncio.sleep(0.2)
-        for task in background_tasks:
-            provider_info, media_response = await task
-            yield Reasoning(label="Finished", status=f"{time.time() - started:.2f}s")
-            yield provider_info
-            yield media_response
+        async with StreamSession(
+            headers=headers,
+            timeout=timeout,
+            **await get_connection_pool_args(proxy)
+        ) as session:
+            tasks = [asyncio.create_task(generate(session)) for _ in range(n)]
+            finished_tasks = asyncio.Queue()
+            for task in tasks:
+                task.add_done_callback(finished_tasks.put_nowait)
+            try:
+                pending = len(tasks)
+                while pending:
+                    try:
+                        task = await asyncio.wait_for(finished_tasks.get(), timeout=1)
+                    except asyncio.TimeoutError:
+                        yield Reasoning(label="Generating", status=f"{time.time() - started:.2f}s")
+                        continue
+                    pending -= 1
+                    provider_info, media_response = task.result()
+                    yield Reasoning(label="Finished", status=f"{time.time() - started:.2f}s")
+                    yield provider_info
+                    yield media_response
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
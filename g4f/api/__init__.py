@@ -444,6 +444,13 @@ def update_headers(request: Request, new_api_key: str = None, user: str = None)
     delattr(request, "_headers")
     return request
 
+async def get_provider_models(provider: ProviderType, **kwargs) -> list:
+    # The sync get_models may load the models over the network, keep it off the event loop.
+    # Only providers whose get_models_async returns the same models opt in to it.
+    if not kwargs and getattr(provider, "use_get_models_async", False):
+        return await provider.get_models_async()
+    return await asyncio.to_thread(provider.get_models, **kwargs)
+
 class Api:
     def __init__(self, app: FastAPI) -> None:
         self.app = app
@@ -598,6 +605,7 @@ class Api:
             HTTP_200_OK: {"model": List[ModelResponseModel]},
         })
         async def models():
+            any_models = await asyncio.to_thread(AnyProvider.get_models)
             return {
                 "object": "list",
                 "data": [{
@@ -608,7 +616,7 @@ class Api:
                     "image": isinstance(model, g4f.models.ImageModel),
                     "vision": isinstance(model, g4f.models.VisionModel),
                     "provider": False,
-                } for model in AnyProvider.get_models()] +
+                } for model in any_models] +
                 [{
                     "id": provider_name,
                     "object": "model",
@@ -633,9 +641,9 @@ class Api:
             if not hasattr(provider, "get_models"):
                 models = getattr(provider, "models", [])
             elif credentials is not None and credentials.credentials != "secret":
-                models = provider.get_models(api_key=credentials.credentials)
+                models = await get_provider_models(provider, api_key=credentials.credentials)
             else:
-                models = provider.get_models()
+                models = await get_provider_models(provider)
             return {
                 "object": "list",
                 "data": [{
@@ -1115,9 +1123,9 @@ class Api:
                 provider = AbstractClientFactory.create_provider(None, provider)
             except ProviderNotFoundError as e:
                 return ErrorResponse.from_message(str(e), 404)
-            def safe_get_models(provider: ProviderType) -> list[str]:
+            async def safe_get_models(provider: ProviderType) -> list[str]:
                 try:
-                    return provider.get_models() if hasattr(provider, "get_models") else []
+                    return await get_provider_models(provider) if hasattr(provider, "get_models") else []
                 except Exception:
                     return []
             return {
@@ -1126,7 +1134,7 @@ class Api:
                 'created': 0,
                 'url': provider.url,
                 'label': getattr(provider, "label", None),
-                'models': safe_get_models(provider),
+                'models': await safe_get_models(provider),
                 'image_models': getattr(provider, "image_models", []) or [],
                 'vision_models': [model for model in [getattr(provider, "default_vision_model", None)] if model],
                 'params': [*provider.get_parameters()] if hasattr(provider, "get_parameters") else []
@@ -95,6 +95,13 @@ def get_api_parser(exit_on_error: bool = True) -> ArgumentParser:
         help="Number of worker processes."
     )
 
+    api_parser.add_argument(
+        "--loop",
+        choices=["auto", "asyncio", "uvloop"],
+        default=None,
+        help="Event loop implementation for the API server (default: auto, uses uvloop if installed)."
+    )
+
     api_parser.add_argument(
         "--disable-colors",
         action="store_true",
@@ -255,6 +262,7 @@ def run_api_args(args):
         port=args.port,
         debug=args.debug,
         workers=args.workers,
+        loop=args.loop,
         use_colors=not args.disable_colors,
         reload=args.reload,
         ssl_keyfile=args.ssl_keyfile,
@@ -520,7 +528,7 @@ def generate_autocomplete():
     auth_providers = ["gemini-cli", "antigravity", "qwencode", "github-copilot"]
     auth_subcommands = ["status", "login"]
     # Options for each command
-    api_args = ["--bind", "--port", "--debug", "--gui", "--no-gui", "--model", "--provider", "--media-provider", "--proxy", "--workers", "--disable-colors", "--ignore-cookie-files", "--cookies-dir", "--g4f-api-key", "--ignored-providers", "--cookie-browsers", "--reload", "--demo", "--timeout", "--stream-timeout", "--ssl-keyfile", "--ssl-certfile", "--log-config", "--access-log", "--no-access-log", "--browser-port", "--browser-host"]
+    api_args = ["--bind", "--port", "--debug", "--gui", "--no-gui", "--model", "--provider", "--media-provider", "--proxy", "--workers", "--loop", "--disable-colors", "--ignore-cookie-files", "--cookies-dir", "--g4f-api-key", "--ignored-providers", "--cookie-browsers", "--reload", "--demo", "--timeout", "--stream-timeout", "--ssl-keyfile", "--ssl-certfile", "--log-config", "--access-log", "--no-access-log", "--browser-port", "--browser-host"]
     gui_args = ["--debug"]
     client_args = ["--debug"]
     mcp_args = ["--debug", "--http", "--host", "--port", "--origin", "--safe"]
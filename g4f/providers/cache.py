@@ -2,6 +2,9 @@ from __future__ import annotations
 
 import os
 import json
+import time
+import threading
+from collections import OrderedDict
 from ..image.copy_images import secure_filename
 from ..cookies import get_cookies_dir
 
@@ -40,4 +43,58 @@ class FileStorage():
             for name in files:
                 os.remove(os.path.join(root, name))
             for name in dirs:
-                os.rmdir(os.path.join(root, name))
\ No newline at end of file
+                os.rmdir(os.path.join(root, name))
+
+class TTLCache(OrderedDict):
+    """A dict bounded in size, whose entries expire after ttl seconds. The least recently used entry is evicted first."""
+    def __init__(self, maxsize: int = 512, ttl: float = 3600):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._expires = {}
+        # Shared between threads, lookups may expire and move entries
+        self._lock = threading.RLock()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, ttl: float = None):
+        """Store a value, which expires after ttl seconds instead of the default ttl if given."""
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            self._expires[key] = time.monotonic() + (self.ttl if ttl is None else ttl)
+            while len(self) > self.maxsize:
+                del self[next(iter(self))]
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+            self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._expires.clear()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            if not super().__contains__(key):
+                return False
+            if self._expires.get(key, 0) < time.monotonic():
+                del self[key]
+                return False
+            return True
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key not in self:
+                raise KeyError(key)
+            self.move_to_end(key)
+            return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
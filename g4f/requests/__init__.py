@@ -5,6 +5,7 @@ import json
 import os
 import random
 import time
+import weakref
 from collections.abc import Callable
 from contextlib import asynccontextmanager
 from http.cookies import Morsel
@@ -19,9 +20,17 @@ try:
     has_curl_cffi = True
 except ImportError:
     from typing import Type as Response
+    from aiohttp import TCPConnector
     from .aiohttp import StreamResponse, StreamSession, FormData
 
     has_curl_cffi = False
+try:
+    from curl_cffi import AsyncCurl, __version__ as curl_cffi_version
+
+    # Before 0.16 AsyncSession.close() also closes an AsyncCurl passed to it
+    has_shared_async_curl = tuple(int(part) for part in curl_cffi_version.split(".")[:2]) >= (0, 16)
+except (ImportError, ValueError):
+    has_shared_async_curl = False
 try:
     import webview
 
@@ -323,6 +332,44 @@ async def get_nodriver_session(**kwargs):
     await stop_browser()
 
 
+_connection_pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict] = weakref.WeakKeyDictionary()
+
+
+async def _close_connection_pool(pool):
+    # Finalized by loop.shutdown_asyncgens(), so the pool is closed before its loop
+    try:
+        yield
+    finally:
+        _connection_pools.pop(asyncio.get_running_loop(), None)
+        await pool.close()
+
+
+async def get_connection_pool_args(proxy: str = None) -> dict:
+    """
+    Return StreamSession arguments that share one keep-alive connection pool per event loop,
+    so that sessions to the same host can reuse connections instead of a new TCP and TLS handshake.
+    """
+    if proxy:
+        return {"proxy": proxy}
+    if has_curl_cffi and not has_shared_async_curl:
+        return {}
+    # A loop closed without shutdown_asyncgens() can't close its pool anymore, only drop it
+    for closed_loop in [loop for loop in _connection_pools if loop.is_closed()]:
+        del _connection_pools[closed_loop]
+    loop = asyncio.get_running_loop()
+    if loop not in _connection_pools:
+        if has_curl_cffi:
+            pool = AsyncCurl(loop=loop)
+            args = {"async_curl": pool}
+        else:
+            pool = TCPConnector(limit_per_host=16, keepalive_timeout=60)
+            args = {"connector": pool, "connector_owner": False}
+        closer = _close_connection_pool(pool)
+        await closer.__anext__()
+        _connection_pools[loop] = {"args": args, "closer": closer}
+    return _connection_pools[loop]["args"]
+
+
 async def sse_stream(iter_lines: AsyncIterator[bytes]) -> AsyncIterator[dict]:
     if hasattr(iter_lines, "content"):
         iter_lines = iter_lines.content
@@ -45,6 +45,7 @@ EXTRA_REQUIRE = {
         "prompt_optimizer",
         "websocket-client",
         "pystray",
+        "orjson",
     ],
     'slim': [
         "curl_cffi>=0.6.2",